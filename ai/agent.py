@@ -1,49 +1,167 @@
 import asyncio
-from typing import Optional
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 
-from openai import OpenAI, OpenAIError 
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, OpenAIError
 
-from config.settings import OPENROUTER_API_KEY, OPENROUTER_MODEL
+from config.settings import (
+    AI_BREAKER_COOLDOWN_SECONDS,
+    AI_BREAKER_FAILURES,
+    AI_HEDGE_AFTER_SECONDS,
+    AI_REQUEST_TIMEOUT,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    OPENROUTER_MODELS,
+)
 
+# Вес нового замера в скользящей средней задержки
+_EWMA_ALPHA = 0.3
+# Сколько запросов к разным бэкендам может идти одновременно (основной + хедж)
+_MAX_IN_FLIGHT = 2
 
-_client: Optional[OpenAI] = None
 
+@dataclass
+class _Backend:
+    """Одна модель на одном адресе + состояние её предохранителя."""
+    model: str
+    base_url: str
+    failures: int = 0
+    opened_at: Optional[float] = None
+    trial_in_flight: bool = False
+    ewma_latency: Optional[float] = None
 
-def _get_client() -> Optional[OpenAI]:
-    """Создаём (или возвращаем) клиента OpenRouter (через OpenAI SDK)."""
-    global _client
 
+class _Router:
+    """
+    Выбирает, к какому бэкенду идти: сначала исправные (по возрастанию средней
+    задержки), потом те, у кого истёк таймаут предохранителя (пробный запрос).
+    Бэкенды с разомкнутым предохранителем пропускаются.
+    """
+
+    def __init__(self, backends: List[_Backend]) -> None:
+        self._backends = backends
+        self._lock = threading.Lock()
+
+    def candidates(self) -> List[_Backend]:
+        now = time.monotonic()
+        with self._lock:
+            closed = [b for b in self._backends if b.opened_at is None]
+            half_open = [
+                b for b in self._backends
+                if b.opened_at is not None
+                and now - b.opened_at >= AI_BREAKER_COOLDOWN_SECONDS
+                and not b.trial_in_flight
+            ]
+        # Ещё не замеренные бэкенды считаем быстрыми, чтобы они получили шанс
+        closed.sort(key=lambda b: b.ewma_latency or 0.0)
+        return closed + half_open
+
+    def acquire(self, backend: _Backend) -> bool:
+        """Проверяет, можно ли сейчас слать запрос в бэкенд (и занимает пробный слот)."""
+        with self._lock:
+            if backend.opened_at is None:
+                return True
+            if backend.trial_in_flight:
+                return False
+            if time.monotonic() - backend.opened_at < AI_BREAKER_COOLDOWN_SECONDS:
+                return False
+            backend.trial_in_flight = True
+            return True
+
+    def penalize(self, backend: _Backend, latency: float) -> None:
+        """Бэкенд не уложился в порог хеджирования — не ставим его первым, пока он думает."""
+        with self._lock:
+            if backend.ewma_latency is None or backend.ewma_latency < latency:
+                backend.ewma_latency = latency
+
+    def release(self, backend: _Backend) -> None:
+        """Запрос завершился ошибкой, которая не говорит о здоровье бэкенда."""
+        with self._lock:
+            backend.trial_in_flight = False
+
+    def record(self, backend: _Backend, latency: float, ok: bool) -> None:
+        with self._lock:
+            was_trial = backend.trial_in_flight
+            backend.trial_in_flight = False
+            if ok:
+                # Задержку учитываем только у успешных ответов: быстрый отказ
+                # не должен делать бэкенд «самым быстрым»
+                if backend.ewma_latency is None:
+                    backend.ewma_latency = latency
+                else:
+                    backend.ewma_latency += _EWMA_ALPHA * (latency - backend.ewma_latency)
+                backend.failures = 0
+                backend.opened_at = None
+                return
+
+            backend.failures += 1
+            if was_trial or backend.failures >= AI_BREAKER_FAILURES:
+                if backend.opened_at is None or was_trial:
+                    print(f"Предохранитель ИИ разомкнут: {backend.model} ({backend.base_url})")
+                backend.opened_at = time.monotonic()
+
+
+def _parse_backends(specs: List[str]) -> List[_Backend]:
+    backends = []
+    for spec in specs:
+        model, _, base_url = spec.partition("@")
+        backends.append(_Backend(model=model.strip(), base_url=base_url.strip() or OPENROUTER_BASE_URL))
+    return backends
+
+
+_router = _Router(_parse_backends(OPENROUTER_MODELS))
+_clients: Dict[str, AsyncOpenAI] = {}
+
+
+def _get_client(base_url: str) -> Optional[AsyncOpenAI]:
+    """Создаём (или возвращаем) асинхронного клиента OpenAI SDK для нужного адреса."""
     if not OPENROUTER_API_KEY:
         print("OPENROUTER_API_KEY не задан")
         return None
 
-    if _client is None:
-        print("Создаём клиента OpenRouter")
-        _client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
+    client = _clients.get(base_url)
+    if client is None:
+        print(f"Создаём клиента OpenRouter: {base_url}")
+        client = _clients[base_url] = AsyncOpenAI(
+            base_url=base_url,
             api_key=OPENROUTER_API_KEY,
             default_headers={
-                "HTTP-Referer": "https://your-bot-url.com", 
-                "X-Title": "Habit Tracker Bot",              
-            }
+                "HTTP-Referer": "https://your-bot-url.com",
+                "X-Title": "Habit Tracker Bot",
+            },
+            # Повторы делает роутер на другом бэкенде, а не SDK
+            timeout=AI_REQUEST_TIMEOUT,
+            max_retries=0,
         )
 
-    return _client
+    return client
 
 
-def _call_openrouter_sync(prompt: str, selected_habit: str) -> str:
-    """Синхронный запрос к OpenRouter через OpenAI SDK с учётом выбранной привычки."""
+def _is_backend_failure(e: BaseException) -> bool:
+    """
+    Сбой самого бэкенда (таймаут, сеть, 429, 5xx) — повод перейти к другому
+    и засчитать ошибку предохранителю. Остальное (400, 401, 403...) на любом
+    бэкенде закончится так же, поэтому сразу показываем пользователю.
+    """
+    if isinstance(e, APIConnectionError):
+        return True
+    if isinstance(e, APIStatusError):
+        return e.status_code == 429 or e.status_code >= 500
+    return False
 
-    client = _get_client()
-    if client is None:
-        return (
-            "Сейчас ИИ (OpenRouter) не настроен — не найден API-ключ.\n"
-            "Проверь файл .env (OPENROUTER_API_KEY) и перезапусти бота."
-        )
 
+async def _call_backend(backend: _Backend, prompt: str, selected_habit: str) -> str:
+    """
+    Запрос к одному бэкенду с учётом выбранной привычки.
+    Любая ошибка пробрасывается наружу — её обрабатывает ask_ai.
+    """
+    started = time.monotonic()
     try:
-        completion = client.chat.completions.create(
-            model=OPENROUTER_MODEL,
+        client = _get_client(backend.base_url)
+        completion = await client.chat.completions.create(
+            model=backend.model,
             messages=[
                 {
                     "role": "system",
@@ -64,15 +182,35 @@ def _call_openrouter_sync(prompt: str, selected_habit: str) -> str:
             max_tokens=200,
             temperature=0.8,
         )
+    except asyncio.CancelledError:
+        # Запрос проиграл гонку хеджирования — о здоровье бэкенда это ничего не говорит
+        _router.release(backend)
+        raise
+    except Exception as e:
+        if _is_backend_failure(e):
+            _router.record(backend, time.monotonic() - started, ok=False)
+        else:
+            _router.release(backend)
+        raise
+
+    _router.record(backend, time.monotonic() - started, ok=True)
+
+    message = completion.choices[0].message.content
+    if not message:
+        return f"Попробуй улучшить привычку '{selected_habit}' — начни с малого! 🙂"
 
-        message = completion.choices[0].message.content
-        if not message:
-            return f"Попробуй улучшить привычку '{selected_habit}' — начни с малого! 🙂"
+    return message.strip()
 
-        return message.strip()
-    
 
-    except OpenAIError as e:
+def _error_text(e: Optional[BaseException]) -> str:
+    """Сообщение пользователю по ошибке, после которой ответа от ИИ не будет."""
+    if e is None:
+        return (
+            "Все модели ИИ сейчас временно недоступны.\n"
+            "Попробуй позже или просто выбери одну маленькую цель на сегодня."
+        )
+
+    if isinstance(e, OpenAIError):
         text = str(e)
         print("OpenRouterError:", repr(e))
 
@@ -97,14 +235,69 @@ def _call_openrouter_sync(prompt: str, selected_habit: str) -> str:
             "Попробуй ещё раз немного позже."
         )
 
-    except Exception as e:
-        # Любая другая ошибка (сеть и т.п.)
-        print("Неизвестная ошибка OpenRouter:", repr(e))
+    # Любая другая ошибка (сеть и т.п.)
+    print("Неизвестная ошибка OpenRouter:", repr(e))
+    return (
+        "Не удалось получить ответ от ИИ (OpenRouter).\n"
+        "Попробуй позже или просто выбери одну маленькую цель на сегодня."
+    )
+
+
+async def ask_ai(prompt: str, selected_habit: str) -> str:
+    """
+    Асинхронный запрос совета с учётом выбранной привычки.
+    Идём в самый быстрый исправный бэкенд; если он не ответил за
+    AI_HEDGE_AFTER_SECONDS — параллельно спрашиваем следующий, при сбое
+    бэкенда переходим к следующему. Возвращаем первый успешный ответ.
+    """
+    if not OPENROUTER_API_KEY:
         return (
-            "Не удалось получить ответ от ИИ (OpenRouter).\n"
-            "Попробуй позже или просто выбери одну маленькую цель на сегодня."
+            "Сейчас ИИ (OpenRouter) не настроен — не найден API-ключ.\n"
+            "Проверь файл .env (OPENROUTER_API_KEY) и перезапусти бота."
         )
 
-async def ask_ai(prompt: str, selected_habit: str) -> str:
-    """Асинхронная обёртка над запросом к OpenRouter с учётом выбранной привычки."""
-    return await asyncio.to_thread(_call_openrouter_sync, prompt, selected_habit)
\ No newline at end of file
+    queue = _router.candidates()
+    pending: set = set()
+    backend_of: Dict[asyncio.Task, _Backend] = {}
+    last_error: Optional[BaseException] = None
+
+    def launch_next() -> None:
+        while queue:
+            backend = queue.pop(0)
+            if _router.acquire(backend):
+                task = asyncio.create_task(_call_backend(backend, prompt, selected_habit))
+                backend_of[task] = backend
+                pending.add(task)
+                return
+
+    launch_next()
+    try:
+        while pending:
+            can_hedge = queue and len(pending) < _MAX_IN_FLIGHT
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=AI_HEDGE_AFTER_SECONDS if can_hedge else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            if not done:
+                # Основной запрос медлит — хеджируем следующим бэкендом
+                for task in pending:
+                    _router.penalize(backend_of[task], AI_HEDGE_AFTER_SECONDS)
+                launch_next()
+                continue
+
+            for task in done:
+                error = task.exception()
+                if error is None or not _is_backend_failure(error):
+                    return task.result() if error is None else _error_text(error)
+                last_error = error
+
+            if len(pending) < _MAX_IN_FLIGHT:
+                launch_next()
+
+        return _error_text(last_error)
+    finally:
+        # Проигравшие гонку запросы отменяем: не держим соединения и не тратим квоту
+        for task in pending:
+            task.cancel()
@@ -1,7 +1,9 @@
 from __future__ import annotations
+import asyncio
 from datetime import date
 from typing import Set, Optional
 from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
 from aiogram.types import (
     Message,
     ReplyKeyboardMarkup,
@@ -9,8 +11,11 @@ from aiogram.types import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
     CallbackQuery,
+    FSInputFile,
 )
 from ai.agent import ask_ai
+from bot.profiling import profiler
+from config.settings import ADMIN_IDS, PROFILE_MAX_SECONDS, PROFILE_SIGNAL_SECONDS
 from database.manager import (
     get_or_create_user,
     add_habit,
@@ -25,6 +30,19 @@ router = Router()
 _pending_add_habit: Set[int] = set()
 _pending_mark_habit: Set[int] = set()
 _pending_ai_advice: Set[int] = set() 
+_profile_tasks: Set[asyncio.Task] = set()
+
+AI_ADVICE_PREFIX = "ai_advice_"
+
+
+def is_ai_advice_choice(event: object) -> bool:
+    """Выбор привычки для совета — долгий апдейт с запросом к ИИ (см. bot/middlewares.py)."""
+    return (
+        isinstance(event, CallbackQuery)
+        and bool(event.data)
+        and event.data.startswith(AI_ADVICE_PREFIX)
+        and event.data != f"{AI_ADVICE_PREFIX}cancel"
+    )
 
 # ===================== Клавиатура =====================
 
@@ -77,6 +95,43 @@ async def cmd_help(message: Message) -> None:
     )
     await message.answer(text, reply_markup=main_menu_keyboard())
 
+# ===================== Профилирование (только админы) =====================
+
+@router.message(Command("profile"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_profile(message: Message, command: CommandObject) -> None:
+    """/profile [секунды] — запустить профайлер; повторная команда останавливает его."""
+    if profiler.running:
+        # Запуск мог быть и по SIGUSR2 — тогда файл никто не отправит, поэтому даём путь
+        profiler.stop()
+        path = await asyncio.to_thread(profiler.wait, 10)
+        await message.answer(f"Профайлер остановлен, файл: {path or 'ещё сохраняется'}")
+        return
+
+    seconds = PROFILE_SIGNAL_SECONDS
+    if command.args:
+        try:
+            seconds = float(command.args.strip())
+        except ValueError:
+            seconds = 0
+        if not seconds > 0:
+            await message.answer("Укажи длительность в секундах больше нуля, например: /profile 10")
+            return
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+
+    await message.answer(f"Профилирую {seconds:.0f} с. Отправь /profile ещё раз, чтобы остановить раньше.")
+    _profile_tasks.add(asyncio.create_task(_profile_and_send(message, seconds)))
+
+
+async def _profile_and_send(message: Message, seconds: float) -> None:
+    try:
+        path = await asyncio.to_thread(profiler.run, seconds)
+        if path is not None:
+            await message.answer_document(FSInputFile(path), caption="Профиль (collapsed stacks)")
+    except Exception as e:
+        print(f"Ошибка при профилировании: {e}")
+    finally:
+        _profile_tasks.discard(asyncio.current_task())
+
 @router.message(F.text == "➕ Добавить привычку")
 async def add_habit_start(message: Message) -> None:
     """Шаг 1: просим ввести название привычки."""
@@ -304,14 +359,14 @@ async def ai_advice_start(message: Message) -> None:
         keyboard.inline_keyboard.append([
             InlineKeyboardButton(
                 text=habit.name,
-                callback_data=f"ai_advice_{habit.id}"
+                callback_data=f"{AI_ADVICE_PREFIX}{habit.id}"
             )
         ])
 
     keyboard.inline_keyboard.append([
         InlineKeyboardButton(
             text="Отмена",
-            callback_data="ai_advice_cancel"
+            callback_data=f"{AI_ADVICE_PREFIX}cancel"
         )
     ])
 
@@ -320,14 +375,14 @@ async def ai_advice_start(message: Message) -> None:
         reply_markup=keyboard
     )
 
-@router.callback_query(F.data.startswith("ai_advice_"))
+@router.callback_query(F.data.startswith(AI_ADVICE_PREFIX))
 async def handle_ai_advice_choice(callback: CallbackQuery) -> None:
     """Обрабатываем выбор привычки для получения совета."""
     user_id = callback.from_user.id
     data = callback.data
 
     # Если нажали "Отмена"
-    if data == "ai_advice_cancel":
+    if data == f"{AI_ADVICE_PREFIX}cancel":
         await callback.message.edit_text("Выбор привычки отменён.")
         _pending_ai_advice.discard(user_id)
         await callback.answer()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config.settings import (
+    MAX_CONCURRENT_AI_UPDATES,
+    MAX_CONCURRENT_UPDATES,
+    MAX_PENDING_PER_USER,
+    OVERLOAD_WAIT_SECONDS,
+)
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+OVERLOAD_TEXT = "Сейчас бот перегружен 😔 Попробуй ещё раз через пару секунд."
+
+
+class _UserSlot:
+    """Замок пользователя + счётчик тех, кто его держит или ждёт."""
+
+    __slots__ = ("lock", "pending")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class OrderedThrottlingMiddleware(BaseMiddleware):
+    """
+    Обрабатывает апдейты одного пользователя строго по очереди,
+    а разных пользователей — параллельно.
+    Дополнительно ограничивает общее число одновременно работающих хендлеров:
+    если свободного места нет дольше OVERLOAD_WAIT_SECONDS — отвечаем,
+    что бот перегружен, и апдейт не обрабатываем.
+    Долгие апдейты (is_heavy, например запросы к ИИ по 20 с) занимают места
+    в отдельном лимите и не вытесняют быстрые хендлеры из общего.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_UPDATES,
+        max_pending_per_user: int = MAX_PENDING_PER_USER,
+        wait_timeout: float = OVERLOAD_WAIT_SECONDS,
+        max_heavy_concurrent: int = MAX_CONCURRENT_AI_UPDATES,
+        is_heavy: Optional[Callable[[TelegramObject], bool]] = None,
+    ) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._heavy_semaphore = asyncio.Semaphore(max_heavy_concurrent)
+        self._is_heavy = is_heavy
+        self._max_pending_per_user = max_pending_per_user
+        self._wait_timeout = wait_timeout
+        self._slots: Dict[int, _UserSlot] = {}
+
+    async def __call__(
+        self,
+        handler: Handler,
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await self._run_limited(handler, event, data)
+
+        slot = self._slots.get(user.id)
+        if slot is None:
+            slot = self._slots[user.id] = _UserSlot()
+
+        # Слишком длинная очередь от одного пользователя — лишние тапы отбрасываем
+        if slot.pending >= self._max_pending_per_user:
+            await _reply_overloaded(event)
+            return None
+
+        slot.pending += 1
+        try:
+            async with slot.lock:
+                return await self._run_limited(handler, event, data)
+        finally:
+            slot.pending -= 1
+            # Убираем замок, когда у пользователя не осталось апдейтов в работе
+            if slot.pending == 0 and self._slots.get(user.id) is slot:
+                del self._slots[user.id]
+
+    async def _run_limited(
+        self,
+        handler: Handler,
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        heavy = self._is_heavy is not None and self._is_heavy(event)
+        semaphore = self._heavy_semaphore if heavy else self._semaphore
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self._wait_timeout)
+        except asyncio.TimeoutError:
+            print("Бот перегружен: апдейт отброшен")
+            await _reply_overloaded(event)
+            return None
+
+        try:
+            return await handler(event, data)
+        finally:
+            semaphore.release()
+
+
+async def _reply_overloaded(event: TelegramObject) -> None:
+    """Короткий ответ пользователю, чей апдейт мы не стали обрабатывать."""
+    try:
+        if isinstance(event, Message):
+            await event.answer(OVERLOAD_TEXT)
+        elif isinstance(event, CallbackQuery):
+            await event.answer(OVERLOAD_TEXT)
+    except Exception as e:
+        print(f"Не удалось отправить ответ о перегрузке: {e}")
@@ -0,0 +1,223 @@
+from __future__ import annotations
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+from functools import lru_cache
+from typing import Optional, Set
+
+from config.settings import (
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_SIGNAL_SECONDS,
+    SLOW_CALLBACK_MS,
+)
+import database.manager
+from database.manager import enable_sql_trace, last_sql
+
+# Сравниваем реальные пути: при запуске из каталога-симлинка co_filename
+# может не совпадать с Path.resolve()
+HANDLERS_FILE = os.path.realpath(os.path.join(os.path.dirname(__file__), "handlers.py"))
+MANAGER_FILE = os.path.realpath(database.manager.__file__)
+
+
+@lru_cache(maxsize=None)
+def _real_filename(co_filename: str) -> str:
+    return os.path.realpath(co_filename)
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).name}:{code.co_name}"
+
+
+def _handler_name(frame: Optional[FrameType]) -> Optional[str]:
+    """Имя хендлера из bot/handlers.py, если он есть в стеке."""
+    name = None
+    while frame is not None:
+        if _real_filename(frame.f_code.co_filename) == HANDLERS_FILE:
+            name = frame.f_code.co_name
+        frame = frame.f_back
+    return name
+
+
+def _in_stack(frame: Optional[FrameType], filename: str) -> bool:
+    while frame is not None:
+        if _real_filename(frame.f_code.co_filename) == filename:
+            return True
+        frame = frame.f_back
+    return False
+
+
+# ===================== Сэмплирующий профайлер =====================
+
+class SamplingProfiler:
+    """
+    Раз в PROFILE_INTERVAL_MS снимает стеки всех потоков и считает,
+    сколько раз встретился каждый стек. Результат — файл в формате
+    collapsed stacks («a;b;c 42»), его понимают flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS) -> None:
+        self._interval = interval_ms / 1000
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._finished = threading.Event()
+        self._finished.set()
+        self._last_path: Optional[Path] = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Path]:
+        """Ждёт окончания текущего запуска и возвращает путь к его файлу (None — не дождались)."""
+        if not self._finished.wait(timeout):
+            return None
+        return self._last_path
+
+    def run(self, seconds: float) -> Optional[Path]:
+        """
+        Блокирующе профилирует seconds секунд (или до stop()) и пишет файл.
+        Возвращает путь к файлу или None, если профайлер уже запущен.
+        """
+        with self._lock:
+            if self._running:
+                return None
+            self._running = True
+            self._stop.clear()
+            self._finished.clear()
+
+        try:
+            stacks: Counter = Counter()
+            own_id = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline and not self._stop.wait(self._interval):
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, str(thread_id)))
+                    stacks[";".join(reversed(labels))] += 1
+
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            path = PROFILE_DIR / f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded"
+            with path.open("w", encoding="utf-8") as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+            print(f"Профиль сохранён: {path} ({sum(stacks.values())} сэмплов)")
+            self._last_path = path
+            return path
+        finally:
+            self._running = False
+            self._finished.set()
+
+
+profiler = SamplingProfiler()
+
+
+# ===================== Детектор блокировок цикла событий =====================
+
+class LoopWatchdog:
+    """
+    Корутина в цикле событий регулярно отмечается «я жива», а отдельный поток
+    проверяет отметки. Если цикл не отвечает дольше порога — печатаем стек
+    потока цикла, хендлер из bot/handlers.py и SQL-запрос, если цикл
+    заблокирован внутри database/manager.py.
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_CALLBACK_MS) -> None:
+        self._threshold = threshold_ms / 1000
+        self._interval = self._threshold / 2
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+
+    async def heartbeat(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self._interval)
+
+    def watch(self) -> None:
+        reported_beat = None
+        while True:
+            time.sleep(self._interval)
+            beat = self._beat
+            lag = time.monotonic() - beat - self._interval
+            if lag < self._threshold or beat == reported_beat or self._loop_thread_id is None:
+                continue
+
+            reported_beat = beat
+            print(
+                f"Цикл событий заблокирован уже {lag * 1000:.0f} мс\n"
+                f"{_describe_block(self._loop_thread_id)}"
+            )
+
+
+def _describe_block(thread_id: int) -> str:
+    """Хендлер, SQL-запрос и стек, на которых сейчас стоит поток thread_id."""
+    frame = sys._current_frames().get(thread_id)
+    stack = "".join(traceback.format_stack(frame, limit=8)) if frame else ""
+    # Запрос потока относится к блокировке, только если мы сейчас в БД
+    sql = last_sql(thread_id) if _in_stack(frame, MANAGER_FILE) else None
+    return (
+        f"  хендлер: {_handler_name(frame) or '—'}\n"
+        f"  SQL: {sql or '—'}\n"
+        f"{stack}"
+    )
+
+
+# ===================== Подключение =====================
+
+_background: Set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+def toggle_profiler(seconds: float = PROFILE_SIGNAL_SECONDS) -> bool:
+    """Запускает профилирование в фоне или останавливает текущее. True — если запустили."""
+    if profiler.running:
+        profiler.stop()
+        return False
+    _spawn(asyncio.to_thread(profiler.run, seconds))
+    return True
+
+
+def install_profiling_hooks() -> None:
+    """
+    Вызывается из работающего цикла событий: вешает SIGUSR2 на профайлер
+    и, если SLOW_CALLBACK_MS > 0, запускает детектор блокировок.
+    """
+    loop = asyncio.get_running_loop()
+
+    if hasattr(signal, "SIGUSR2"):
+        try:
+            loop.add_signal_handler(signal.SIGUSR2, toggle_profiler)
+        except (NotImplementedError, RuntimeError) as e:
+            print(f"Не удалось повесить обработчик SIGUSR2: {e}")
+
+    if SLOW_CALLBACK_MS > 0:
+        enable_sql_trace()
+        watchdog = LoopWatchdog()
+        _spawn(watchdog.heartbeat())
+        threading.Thread(target=watchdog.watch, name="loop-watchdog", daemon=True).start()
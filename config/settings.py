@@ -11,3 +11,37 @@ DATABASE_PATH = os.getenv("DATABASE_PATH", str(BASE_DIR / "habit_tracker.db"))
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openai/gpt-4o-mini")
 
+
+# Ограничения нагрузки на обработчики (см. bot/middlewares.py)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "32"))
+# Отдельный лимит для запросов к ИИ, чтобы они не занимали общий
+MAX_CONCURRENT_AI_UPDATES = int(os.getenv("MAX_CONCURRENT_AI_UPDATES", "8"))
+MAX_PENDING_PER_USER = int(os.getenv("MAX_PENDING_PER_USER", "5"))
+OVERLOAD_WAIT_SECONDS = float(os.getenv("OVERLOAD_WAIT_SECONDS", "3"))
+
+# Обслуживание БД (см. database/maintenance.py)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+VACUUM_PAGES_PER_STEP = int(os.getenv("VACUUM_PAGES_PER_STEP", "200"))
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "24"))
+
+# Маршрутизация запросов к ИИ (см. ai/agent.py).
+# OPENROUTER_MODELS — список через запятую в порядке приоритета,
+# у модели можно указать свой адрес: "model@https://host/api/v1"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+OPENROUTER_MODELS = [
+    m.strip() for m in os.getenv("OPENROUTER_MODELS", OPENROUTER_MODEL).split(",") if m.strip()
+]
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", "20"))
+AI_HEDGE_AFTER_SECONDS = float(os.getenv("AI_HEDGE_AFTER_SECONDS", "4"))
+AI_BREAKER_FAILURES = int(os.getenv("AI_BREAKER_FAILURES", "3"))
+AI_BREAKER_COOLDOWN_SECONDS = float(os.getenv("AI_BREAKER_COOLDOWN_SECONDS", "60"))
+
+# Профилирование работающего бота (см. bot/profiling.py)
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles")))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "30"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "300"))
+# Порог блокировки цикла событий в мс, 0 — детектор выключен
+SLOW_CALLBACK_MS = float(os.getenv("SLOW_CALLBACK_MS", "200"))
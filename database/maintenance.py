@@ -0,0 +1,149 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Tuple
+
+from config.settings import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    MAINTENANCE_INTERVAL_HOURS,
+    VACUUM_PAGES_PER_STEP,
+)
+from database.manager import get_connection, init_db
+
+
+def _archive_horizon(today: date) -> date:
+    """
+    Граница архивации: первое число месяца, в который попадает
+    today - ARCHIVE_AFTER_DAYS. Так месяц всегда сворачивается целиком.
+    """
+    cutoff = today - timedelta(days=ARCHIVE_AFTER_DAYS)
+    return cutoff.replace(day=1)
+
+
+def archive_old_entries(today: date | None = None) -> int:
+    """
+    Сворачивает записи старше горизонта в entry_rollups и удаляет их из entries.
+    Работает небольшими пачками: каждая пачка — отдельная короткая транзакция,
+    поэтому запись в БД не блокируется надолго.
+    Возвращает количество перенесённых записей.
+    """
+    horizon = _archive_horizon(today or date.today()).isoformat()
+    moved = 0
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        while True:
+            cur.execute(
+                """
+                SELECT id, habit_id, date, done FROM entries
+                WHERE date < ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (horizon, ARCHIVE_BATCH_SIZE),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+
+            # (habit_id, "YYYY-MM") -> [total, done, done_days]
+            rollups: Dict[Tuple[int, str], list] = defaultdict(lambda: [0, 0, 0])
+            for _, habit_id, entry_date, done in rows:
+                day = date.fromisoformat(entry_date)
+                acc = rollups[(habit_id, entry_date[:7])]
+                acc[0] += 1
+                if done:
+                    acc[1] += 1
+                    acc[2] |= 1 << (day.day - 1)
+
+            cur.executemany(
+                """
+                INSERT INTO entry_rollups (habit_id, month, total, done, done_days)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (habit_id, month) DO UPDATE SET
+                    total = total + excluded.total,
+                    done = done + excluded.done,
+                    done_days = done_days | excluded.done_days
+                """,
+                [(hid, month, t, d, days) for (hid, month), (t, d, days) in rollups.items()],
+            )
+            cur.executemany("DELETE FROM entries WHERE id = ?", [(row[0],) for row in rows])
+            conn.commit()
+            moved += len(rows)
+
+        return moved
+    finally:
+        conn.close()
+
+
+def incremental_vacuum() -> int:
+    """
+    Возвращает свободные страницы файлу БД шагами по VACUUM_PAGES_PER_STEP.
+    Возвращает количество освобождённых страниц.
+    """
+    freed = 0
+    conn = get_connection()
+    try:
+        # Без auto_vacuum = INCREMENTAL прагма ничего не делает (см. convert_to_incremental_vacuum)
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free_pages:
+            step = min(free_pages, VACUUM_PAGES_PER_STEP)
+            conn.execute(f"PRAGMA incremental_vacuum({step})").fetchall()
+            conn.commit()
+            left = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if left >= free_pages:
+                break
+            freed += free_pages - left
+            free_pages = left
+        return freed
+    finally:
+        conn.close()
+
+
+def convert_to_incremental_vacuum() -> None:
+    """
+    Одноразовый перевод существующего файла в режим auto_vacuum=INCREMENTAL.
+    Требует полного VACUUM: файл переписывается целиком под эксклюзивной
+    блокировкой, поэтому запускать при остановленном боте.
+    """
+    conn = get_connection()
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            print("БД уже в режиме auto_vacuum=INCREMENTAL")
+            return
+
+        print("Переводим БД в режим auto_vacuum=INCREMENTAL (полный VACUUM), это может занять время...")
+        started = time.monotonic()
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        print(f"Готово за {time.monotonic() - started:.1f} с")
+    finally:
+        conn.close()
+
+
+def run_maintenance() -> None:
+    """Полный проход обслуживания: архивация старых записей и сжатие файла."""
+    try:
+        moved = archive_old_entries()
+        freed = incremental_vacuum()
+        print(f"Обслуживание БД: свёрнуто записей {moved}, освобождено страниц {freed}")
+    except Exception as e:
+        print(f"Ошибка при обслуживании БД: {e}")
+
+
+async def maintenance_loop() -> None:
+    """Фоновая задача: запускает обслуживание БД раз в MAINTENANCE_INTERVAL_HOURS."""
+    while True:
+        await asyncio.to_thread(run_maintenance)
+        await asyncio.sleep(MAINTENANCE_INTERVAL_HOURS * 3600)
+
+
+if __name__ == "__main__":
+    init_db()
+    convert_to_incremental_vacuum()
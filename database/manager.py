@@ -1,4 +1,5 @@
 import sqlite3
+import threading
 from datetime import datetime, date
 from typing import List, Dict, Any
 
@@ -34,17 +35,103 @@ CREATE TABLE IF NOT EXISTS entries (
     created_at TEXT,
     FOREIGN KEY (habit_id) REFERENCES habits(id)
 );
+
+-- Старые записи сворачиваются сюда (см. database/maintenance.py):
+-- одна строка на привычку и месяц, done_days — битовая маска выполненных дней
+CREATE TABLE IF NOT EXISTS entry_rollups (
+    habit_id   INTEGER NOT NULL,
+    month      TEXT NOT NULL,          -- YYYY-MM
+    total      INTEGER NOT NULL DEFAULT 0,
+    done       INTEGER NOT NULL DEFAULT 0,
+    done_days  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (habit_id, month),
+    FOREIGN KEY (habit_id) REFERENCES habits(id)
+) WITHOUT ROWID;
 """
 
 
+# Текущий SQL-запрос каждого потока — для детектора блокировок (bot/profiling.py).
+# Запоминаем до выполнения: ожидание блокировки БД происходит ещё до того,
+# как sqlite3 вызвал бы trace callback.
+_trace_sql = False
+_last_sql: Dict[int, str] = {}
+
+
+def _remember_sql(statement: str) -> None:
+    _last_sql[threading.get_ident()] = statement
+
+
+def _forget_sql() -> None:
+    _last_sql.pop(threading.get_ident(), None)
+
+
+class _TracedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        _remember_sql(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        _remember_sql(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        _remember_sql(sql_script)
+        return super().executescript(sql_script)
+
+
+class _TracedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        _remember_sql("COMMIT")
+        super().commit()
+
+    def close(self):
+        _forget_sql()
+        super().close()
+
+
+def enable_sql_trace() -> None:
+    """Включает запоминание текущего SQL-запроса для новых соединений."""
+    global _trace_sql
+    _trace_sql = True
+
+
+def last_sql(thread_id: int) -> str | None:
+    return _last_sql.get(thread_id)
+
+
 def get_connection() -> sqlite3.Connection:
-    return sqlite3.connect(DB_PATH)
+    if not _trace_sql:
+        return sqlite3.connect(DB_PATH)
+    _forget_sql()
+    return sqlite3.connect(DB_PATH, factory=_TracedConnection)
 
 
 def init_db() -> None:
     """Создаёт файл базы данных и таблицы, если их ещё нет."""
     conn = get_connection()
     try:
+        # В новом файле auto_vacuum включается бесплатно — до создания таблиц.
+        # Старый файл переводится отдельно: python -m database.maintenance
+        is_new = conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+        if is_new:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        elif conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print(
+                "БД не в режиме auto_vacuum=INCREMENTAL, файл не будет сжиматься. "
+                "Для перевода остановите бота и выполните: python -m database.maintenance"
+            )
         conn.executescript(SCHEMA)
         conn.commit()
     finally:
@@ -136,7 +223,7 @@ def add_entry(user_id: int, habit_id: int, entry_date: date) -> bool:
             INSERT INTO entries (habit_id, date, done, note, created_at) 
             VALUES (?, ?, ?, ?, ?)
             """,
-            (habit_id, entry_date.isoformat(), 1, "", created_at)
+            (habit_id, entry_date.isoformat(), 1, None, created_at)
         )
         
         conn.commit()
@@ -154,6 +241,7 @@ def add_entry(user_id: int, habit_id: int, entry_date: date) -> bool:
 def get_stats(user_id: int) -> Dict[int, Dict[str, Any]]:
     """
     Простая статистика: по каждой привычке — сколько всего записей и сколько выполнений.
+    Учитывает и свежие записи, и свёрнутые в entry_rollups.
     Возвращает словарь {habit_id: {"total": ..., "done": ...}}
     """
     conn = get_connection()
@@ -167,7 +255,15 @@ def get_stats(user_id: int) -> Dict[int, Dict[str, Any]]:
             total = cur.fetchone()[0] or 0
             cur.execute("SELECT COUNT(*) FROM entries WHERE habit_id = ? AND done = 1", (hid,))
             done = cur.fetchone()[0] or 0
+            cur.execute(
+                "SELECT SUM(total), SUM(done) FROM entry_rollups WHERE habit_id = ?",
+                (hid,),
+            )
+            rolled_total, rolled_done = cur.fetchone()
+            total += rolled_total or 0
+            done += rolled_done or 0
             out[hid] = {"total": total, "done": done}
         return out
     finally:
         conn.close()
+
@@ -3,8 +3,11 @@ import asyncio
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
-from bot.handlers import router
+from bot.handlers import is_ai_advice_choice, router
+from bot.middlewares import OrderedThrottlingMiddleware
+from bot.profiling import install_profiling_hooks
 from config.settings import TELEGRAM_BOT_TOKEN
+from database.maintenance import maintenance_loop
 from database.manager import init_db
 
 
@@ -13,15 +16,30 @@ async def main() -> None:
     if not TELEGRAM_BOT_TOKEN:
         raise RuntimeError("TELEGRAM_BOT_TOKEN не задан в .env")
 
+    # SIGUSR2 для профайлера и детектор блокировок цикла событий
+    install_profiling_hooks()
+
     # Инициализируем базу данных (если файла ещё нет — он будет создан)
     init_db()
 
     bot = Bot(token=TELEGRAM_BOT_TOKEN)
     dp = Dispatcher(storage=MemoryStorage())
+
+    # Один экземпляр на оба типа апдейтов: общий лимит и общие замки пользователей
+    throttling = OrderedThrottlingMiddleware(is_heavy=is_ai_advice_choice)
+    dp.message.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(throttling)
+
     dp.include_router(router)
 
+    # Архивация старых записей и сжатие файла БД в фоне
+    maintenance_task = asyncio.create_task(maintenance_loop())
+
     print("Bot polling started...")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        maintenance_task.cancel()
 
 
 if __name__ == "__main__":
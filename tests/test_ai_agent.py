@@ -0,0 +1,209 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ai.agent as agent
+
+
+class StubBackend:
+    """
+    Локальный HTTP-сервер, отвечающий как /v1/chat/completions.
+    status и delay можно менять прямо во время теста.
+    """
+
+    def __init__(self, name: str, status: int = 200, delay: float = 0.0) -> None:
+        self.name = name
+        self.status = status
+        self.delay = delay
+        self.hits = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                stub.hits += 1
+                time.sleep(stub.delay)
+
+                if stub.status == 200:
+                    body = {
+                        "id": "stub",
+                        "object": "chat.completion",
+                        "created": 0,
+                        "model": stub.name,
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": f"ответ от {stub.name}"},
+                            "finish_reason": "stop",
+                        }],
+                    }
+                else:
+                    body = {"error": {"message": f"stub error {stub.status}"}}
+
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(stub.status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def spec(self) -> str:
+        return f"{self.name}@http://127.0.0.1:{self._server.server_port}/v1"
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def stubs():
+    created = []
+
+    def make(name: str, status: int = 200, delay: float = 0.0) -> StubBackend:
+        stub = StubBackend(name, status, delay)
+        created.append(stub)
+        return stub
+
+    yield make
+    for stub in created:
+        stub.close()
+
+
+@pytest.fixture
+def route(monkeypatch):
+    """Настраивает роутер ai.agent на заданные заглушки."""
+    monkeypatch.setattr(agent, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(agent, "_clients", {})
+    monkeypatch.setattr(agent, "AI_HEDGE_AFTER_SECONDS", 5.0)
+    monkeypatch.setattr(agent, "AI_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(agent, "AI_BREAKER_COOLDOWN_SECONDS", 60.0)
+
+    def configure(*backends: StubBackend, **settings) -> agent._Router:
+        for name, value in settings.items():
+            monkeypatch.setattr(agent, name, value)
+        monkeypatch.setattr(agent, "OPENROUTER_MODELS", [b.spec for b in backends])
+        router = agent._Router(agent._parse_backends(agent.OPENROUTER_MODELS))
+        monkeypatch.setattr(agent, "_router", router)
+        return router
+
+    return configure
+
+
+@pytest.fixture
+def loop():
+    """Один цикл событий на тест: асинхронные клиенты SDK привязаны к нему."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
+
+
+@pytest.fixture
+def ask(loop):
+    def ask() -> str:
+        return loop.run_until_complete(agent.ask_ai("совет", "Зарядка"))
+    return ask
+
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_failover_to_next_backend(stubs, route, ask, status):
+    bad, good = stubs("bad", status=status), stubs("good")
+    router = route(bad, good)
+
+    assert ask() == "ответ от good"
+    assert bad.hits == 1
+    assert good.hits == 1
+    assert router._backends[0].failures == 1
+
+
+def test_client_error_is_not_failed_over(stubs, route, ask):
+    unauthorized, good = stubs("unauthorized", status=401), stubs("good")
+    router = route(unauthorized, good)
+
+    assert "401" in ask()
+    assert good.hits == 0
+    assert router._backends[0].failures == 0
+    assert router._backends[0].opened_at is None
+
+
+def test_breaker_opens_then_allows_single_half_open_trial(stubs, route, ask, loop):
+    bad = stubs("bad", status=500)
+    router = route(bad, AI_BREAKER_FAILURES=2, AI_BREAKER_COOLDOWN_SECONDS=0.3)
+    backend = router._backends[0]
+
+    ask()
+    ask()
+    assert bad.hits == 2
+    assert backend.opened_at is not None
+
+    # Предохранитель разомкнут — запрос до сервера не доходит
+    assert "недоступны" in ask()
+    assert bad.hits == 2
+
+    # После паузы бэкенд ожил, но пробный запрос пропускается только один
+    time.sleep(0.35)
+    bad.status, bad.delay = 200, 0.3
+
+    async def two_at_once():
+        return await asyncio.gather(
+            agent.ask_ai("совет", "Зарядка"),
+            agent.ask_ai("совет", "Зарядка"),
+        )
+
+    results = loop.run_until_complete(two_at_once())
+    assert bad.hits == 3
+    assert "ответ от bad" in results
+    assert sum("недоступны" in r for r in results) == 1
+    assert backend.opened_at is None
+    assert backend.failures == 0
+
+
+def test_hedged_request_when_primary_stalls(stubs, route, loop):
+    slow, fast = stubs("slow", delay=1.5), stubs("fast")
+    route(slow, fast, AI_HEDGE_AFTER_SECONDS=0.2)
+
+    async def timed():
+        started = time.monotonic()
+        answer = await agent.ask_ai("совет", "Зарядка")
+        elapsed = time.monotonic() - started
+        # Медленный запрос должен завершиться отменой задолго до ответа заглушки
+        leftovers = asyncio.all_tasks() - {asyncio.current_task()}
+        if leftovers:
+            await asyncio.wait(leftovers, timeout=0.5)
+        return answer, elapsed, leftovers
+
+    answer, elapsed, leftovers = loop.run_until_complete(timed())
+    assert answer == "ответ от fast"
+    assert 0.2 <= elapsed < 1.0
+    assert slow.hits == 1
+    assert fast.hits == 1
+    # Проигравший гонку запрос отменён, а не дорабатывает в фоне
+    assert all(task.cancelled() for task in leftovers)
+
+
+def test_ewma_prefers_faster_backend(stubs, route, ask):
+    slow, fast = stubs("slow", delay=0.15), stubs("fast", delay=0.01)
+    router = route(slow, fast)
+
+    for _ in range(4):
+        ask()
+
+    # Первые два запроса знакомятся с обоими бэкендами, дальше — только быстрый
+    assert slow.hits == 1
+    assert fast.hits == 3
+    assert router.candidates()[0].model == "fast"
@@ -0,0 +1,130 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import database.maintenance as maintenance
+import database.manager as manager
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Пустая БД во временном файле, инициализированная init_db."""
+    path = tmp_path / "habits.db"
+    monkeypatch.setattr(manager, "DB_PATH", str(path))
+    monkeypatch.setattr(maintenance, "ARCHIVE_AFTER_DAYS", 30)
+    monkeypatch.setattr(maintenance, "ARCHIVE_BATCH_SIZE", 64)
+    manager.init_db()
+    return path
+
+
+def add_habit_with_entries(user_id: int, days, done: int = 1) -> int:
+    habit = manager.add_habit(user_id=user_id, name="Зарядка", period="daily")
+    add_entries(habit.id, days, done)
+    return habit.id
+
+
+def add_entries(habit_id: int, days, done: int = 1) -> None:
+    conn = manager.get_connection()
+    try:
+        conn.executemany(
+            "INSERT INTO entries (habit_id, date, done) VALUES (?, ?, ?)",
+            [(habit_id, day.isoformat(), done) for day in days],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def use_old_file(path, monkeypatch) -> None:
+    """Уже существующая БД без auto_vacuum — как файлы, созданные до архивации."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (user_id INTEGER PRIMARY KEY)")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(manager, "DB_PATH", str(path))
+
+
+def query(sql: str, *params):
+    conn = manager.get_connection()
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_horizon_is_rounded_down_to_first_of_month(db):
+    assert maintenance._archive_horizon(date(2026, 10, 19)) == date(2026, 9, 1)
+
+    habit_id = add_habit_with_entries(1, [date(2026, 8, 31), date(2026, 9, 1), date(2026, 9, 25)])
+    assert maintenance.archive_old_entries(today=date(2026, 10, 19)) == 1
+
+    # Сентябрь целиком остаётся в entries, даже 1-е число старше 30 дней
+    assert query("SELECT date FROM entries WHERE habit_id = ? ORDER BY date", habit_id) == [
+        ("2026-09-01",),
+        ("2026-09-25",),
+    ]
+    assert query("SELECT month, total FROM entry_rollups") == [("2026-08", 1)]
+
+
+def test_second_pass_merges_into_existing_rollup(db):
+    habit_id = add_habit_with_entries(1, [date(2025, 1, 3), date(2025, 1, 5)])
+    maintenance.archive_old_entries(today=date(2026, 10, 19))
+
+    add_entries(habit_id, [date(2025, 1, 5), date(2025, 1, 10)])
+    add_entries(habit_id, [date(2025, 1, 7)], done=0)
+    maintenance.archive_old_entries(today=date(2026, 10, 19))
+
+    total, done, done_days = query(
+        "SELECT total, done, done_days FROM entry_rollups WHERE habit_id = ? AND month = '2025-01'",
+        habit_id,
+    )[0]
+    assert total == 5
+    assert done == 4
+    # Биты дней 3, 5 и 10; невыполненное 7-е число бит не ставит
+    assert done_days == (1 << 2) | (1 << 4) | (1 << 9)
+    assert query("SELECT COUNT(*) FROM entries") == [(0,)]
+
+
+def test_get_stats_is_unchanged_by_archival(db):
+    start = date(2025, 6, 1)
+    first = add_habit_with_entries(1, [start + timedelta(days=i) for i in range(500)])
+    second = add_habit_with_entries(1, [start + timedelta(days=i) for i in range(0, 600, 2)])
+    add_entries(second, [start + timedelta(days=i) for i in range(1, 200, 2)], done=0)
+
+    before = manager.get_stats(1)
+    moved = maintenance.archive_old_entries(today=date(2026, 10, 19))
+
+    assert moved > 0
+    assert query("SELECT COUNT(*) FROM entries")[0][0] == 900 - moved
+    assert manager.get_stats(1) == before
+    assert before[first] == {"total": 500, "done": 500}
+    assert before[second] == {"total": 400, "done": 300}
+
+
+def test_incremental_vacuum_frees_pages_after_archival(db):
+    add_habit_with_entries(1, [date(2024, 1, 1) + timedelta(days=i % 365) for i in range(3000)])
+    maintenance.archive_old_entries(today=date(2026, 10, 19))
+
+    assert query("PRAGMA freelist_count")[0][0] > 0
+    assert maintenance.incremental_vacuum() > 0
+    assert query("PRAGMA freelist_count")[0][0] == 0
+
+
+def test_incremental_vacuum_is_noop_without_incremental_mode(tmp_path, monkeypatch):
+    use_old_file(tmp_path / "old.db", monkeypatch)
+    manager.init_db()
+
+    assert query("PRAGMA auto_vacuum") == [(0,)]
+    assert maintenance.incremental_vacuum() == 0
+
+
+def test_init_db_enables_incremental_only_on_new_file(db, tmp_path, monkeypatch):
+    assert query("PRAGMA auto_vacuum") == [(2,)]
+
+    use_old_file(tmp_path / "old.db", monkeypatch)
+    manager.init_db()
+    assert query("PRAGMA auto_vacuum") == [(0,)]
+
+    maintenance.convert_to_incremental_vacuum()
+    assert query("PRAGMA auto_vacuum") == [(2,)]
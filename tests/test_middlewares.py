@@ -0,0 +1,129 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from aiogram.types import CallbackQuery, Message, User
+
+from bot.middlewares import OVERLOAD_TEXT, OrderedThrottlingMiddleware
+
+
+def user(user_id: int) -> User:
+    return User(id=user_id, is_bot=False, first_name="test")
+
+
+def message() -> MagicMock:
+    event = MagicMock(spec=Message)
+    event.answer = AsyncMock()
+    return event
+
+
+def callback(data: str) -> MagicMock:
+    event = MagicMock(spec=CallbackQuery)
+    event.data = data
+    event.answer = AsyncMock()
+    return event
+
+
+def test_same_user_runs_in_order_other_users_in_parallel():
+    log = []
+
+    async def scenario():
+        middleware = OrderedThrottlingMiddleware(max_concurrent=10)
+
+        def handler_for(name, delay):
+            async def handler(event, data):
+                log.append(f"{name} start")
+                await asyncio.sleep(delay)
+                log.append(f"{name} end")
+            return handler
+
+        await asyncio.gather(
+            middleware(handler_for("a1", 0.05), message(), {"event_from_user": user(1)}),
+            middleware(handler_for("a2", 0.0), message(), {"event_from_user": user(1)}),
+            middleware(handler_for("b1", 0.0), message(), {"event_from_user": user(2)}),
+        )
+        return middleware
+
+    middleware = asyncio.run(scenario())
+
+    # a2 не начинается, пока не закончится a1; b1 не ждёт пользователя 1
+    assert log.index("a1 end") < log.index("a2 start")
+    assert log.index("b1 end") < log.index("a1 end")
+    # Замки пользователей убираются, когда у них ничего не осталось в работе
+    assert middleware._slots == {}
+
+
+def test_too_many_pending_updates_from_one_user_are_shed():
+    handled = []
+
+    async def scenario():
+        middleware = OrderedThrottlingMiddleware(max_concurrent=10, max_pending_per_user=2)
+
+        async def handler(event, data):
+            handled.append(event)
+            await asyncio.sleep(0.05)
+
+        events = [message() for _ in range(3)]
+        await asyncio.gather(*(
+            middleware(handler, event, {"event_from_user": user(1)}) for event in events
+        ))
+        return events
+
+    events = asyncio.run(scenario())
+
+    assert handled == events[:2]
+    events[2].answer.assert_awaited_once_with(OVERLOAD_TEXT)
+
+
+def test_update_is_shed_when_no_global_slot_frees_in_time():
+    handled = []
+
+    async def scenario():
+        middleware = OrderedThrottlingMiddleware(max_concurrent=1, wait_timeout=0.05)
+
+        async def handler(event, data):
+            handled.append(event)
+            await asyncio.sleep(0.2)
+
+        slow, shed = message(), message()
+        await asyncio.gather(
+            middleware(handler, slow, {"event_from_user": user(1)}),
+            middleware(handler, shed, {"event_from_user": user(2)}),
+        )
+        return slow, shed, middleware
+
+    slow, shed, middleware = asyncio.run(scenario())
+
+    assert handled == [slow]
+    shed.answer.assert_awaited_once_with(OVERLOAD_TEXT)
+    slow.answer.assert_not_awaited()
+    assert middleware._slots == {}
+
+
+def test_heavy_updates_use_their_own_limit():
+    handled = []
+
+    async def scenario():
+        middleware = OrderedThrottlingMiddleware(
+            max_concurrent=1,
+            max_heavy_concurrent=1,
+            wait_timeout=0.05,
+            is_heavy=lambda event: isinstance(event, CallbackQuery),
+        )
+
+        async def handler(event, data):
+            handled.append(event)
+            await asyncio.sleep(0.2)
+
+        ai_choice, cheap, second_ai_choice = callback("ai_advice_1"), message(), callback("ai_advice_2")
+        await asyncio.gather(
+            middleware(handler, ai_choice, {"event_from_user": user(1)}),
+            middleware(handler, cheap, {"event_from_user": user(2)}),
+            middleware(handler, second_ai_choice, {"event_from_user": user(3)}),
+        )
+        return ai_choice, cheap, second_ai_choice
+
+    ai_choice, cheap, second_ai_choice = asyncio.run(scenario())
+
+    # Долгий запрос к ИИ не мешает быстрому хендлеру, но второй ИИ-запрос отбрасывается
+    assert handled == [ai_choice, cheap]
+    second_ai_choice.answer.assert_awaited_once_with(OVERLOAD_TEXT)
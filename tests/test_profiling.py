@@ -0,0 +1,165 @@
+import asyncio
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+import bot.handlers as handlers
+import bot.profiling as profiling
+import database.manager as manager
+
+
+def busy_marker(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_marker, args=(stop,), name="busy-thread")
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_profiler_writes_collapsed_stacks(tmp_path, monkeypatch, busy_thread):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    profiler = profiling.SamplingProfiler(interval_ms=2)
+
+    path = profiler.run(0.2)
+
+    assert path is not None and path.parent == tmp_path
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines
+    # Формат collapsed stacks: «поток;кадр;кадр количество»
+    assert all(re.fullmatch(r"\S.*;.* \d+", line) for line in lines)
+    assert any(
+        line.startswith("busy-thread;") and "test_profiling.py:busy_marker" in line
+        for line in lines
+    )
+    assert profiler.wait(0) == path
+    assert not profiler.running
+
+
+def test_profiler_stop_ends_run_early(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", tmp_path)
+    profiler = profiling.SamplingProfiler(interval_ms=2)
+    result = {}
+
+    thread = threading.Thread(target=lambda: result.setdefault("path", profiler.run(30)))
+    thread.start()
+    time.sleep(0.1)
+    assert profiler.running
+    # Второй запуск, пока идёт первый, ничего не делает
+    assert profiler.run(1) is None
+
+    started = time.monotonic()
+    profiler.stop()
+    path = profiler.wait(2)
+    thread.join(2)
+
+    assert time.monotonic() - started < 1
+    assert path is not None and path == result["path"] and path.exists()
+    assert not profiler.running
+
+
+# ===================== Детектор блокировок =====================
+
+@pytest.fixture
+def traced_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(manager, "DB_PATH", str(tmp_path / "habits.db"))
+    monkeypatch.setattr(manager, "_trace_sql", True)
+    manager.init_db()
+    return tmp_path / "habits.db"
+
+
+def hold_exclusive_lock(path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("BEGIN EXCLUSIVE")
+    return conn
+
+
+def test_lock_wait_is_blamed_on_the_waiting_statement(traced_db):
+    habit = manager.add_habit(user_id=1, name="Зарядка", period="daily")
+    committed, locked = threading.Event(), threading.Event()
+
+    def loop_thread() -> None:
+        # Перед ожиданием блокировки последним запросом потока был COMMIT из add_habit
+        manager.add_habit(user_id=1, name="Вода", period="daily")
+        committed.set()
+        locked.wait(2)
+        manager.add_entry(user_id=1, habit_id=habit.id, entry_date=date(2026, 10, 19))
+
+    thread = threading.Thread(target=loop_thread)
+    thread.start()
+    committed.wait(2)
+    lock = hold_exclusive_lock(traced_db)
+    locked.set()
+    time.sleep(0.2)
+    report = profiling._describe_block(thread.ident)
+    lock.rollback()
+    lock.close()
+    thread.join(5)
+
+    assert "SELECT COUNT(*) FROM entries" in report
+    assert "COMMIT" not in report
+    # Соединение закрыто — запрос потока забыт
+    assert manager.last_sql(thread.ident) is None
+
+
+def test_non_sql_block_does_not_report_stale_statement(traced_db):
+    def loop_thread(ready: threading.Event) -> None:
+        manager.add_habit(user_id=1, name="Зарядка", period="daily")
+        ready.set()
+        time.sleep(0.5)
+
+    ready = threading.Event()
+    thread = threading.Thread(target=loop_thread, args=(ready,))
+    thread.start()
+    ready.wait(2)
+    time.sleep(0.1)
+    report = profiling._describe_block(thread.ident)
+    thread.join(5)
+
+    assert "SQL: —" in report
+
+
+def test_block_inside_handler_names_handler_and_sql(traced_db):
+    manager.add_habit(user_id=1, name="Зарядка", period="daily")
+    message = MagicMock()
+    message.text = "1"
+    message.from_user.id = 1
+    message.answer = AsyncMock()
+
+    lock = hold_exclusive_lock(traced_db)
+    thread = threading.Thread(target=lambda: asyncio.run(handlers.mark_habit_finish(message)))
+    thread.start()
+    time.sleep(0.2)
+    report = profiling._describe_block(thread.ident)
+    lock.rollback()
+    lock.close()
+    thread.join(5)
+
+    assert "хендлер: mark_habit_finish" in report
+    assert "FROM habits WHERE user_id = ?" in report
+    message.answer.assert_awaited()
+
+
+def test_handler_is_found_through_symlinked_checkout(tmp_path):
+    link = tmp_path / "checkout"
+    link.symlink_to(os.path.dirname(profiling.HANDLERS_FILE), target_is_directory=True)
+
+    # Код, загруженный через симлинк, видит путь к файлу без разыменования
+    namespace = {"sys": sys}
+    source = "def cmd_fake():\n    return sys._getframe()\n"
+    exec(compile(source, str(link / "handlers.py"), "exec"), namespace)
+
+    assert profiling._handler_name(namespace["cmd_fake"]()) == "cmd_fake"